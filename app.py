@@ -1,11 +1,11 @@
 import os
-import json
 import time
 import uuid
 import threading
 import queue
 from typing import Dict, Any
 
+import orjson
 from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 
@@ -16,6 +16,11 @@ from app_services.extractor import extract_product_signals
 from app_services.searcher import build_queries, search_candidates
 from app_services.scorer import score_candidates
 
+HEARTBEAT_INTERVAL = 15
+JOB_TTL_SECONDS = 900
+MAX_JOBS = 1000
+REAPER_INTERVAL = 60
+
 
 def create_app() -> Flask:
     app = Flask(__name__)
@@ -28,13 +33,25 @@ def create_app() -> Flask:
     jobs: Dict[str, Dict[str, Any]] = {}
     jobs_lock = threading.Lock()
 
+    def _reap_jobs() -> None:
+        # Drop finished jobs once their results have been around for JOB_TTL_SECONDS
+        while True:
+            time.sleep(REAPER_INTERVAL)
+            now = time.time()
+            with jobs_lock:
+                for jid, job in list(jobs.items()):
+                    if job["status"] in {"done", "error"} and now - job.get("finished_at", job["created_at"]) > JOB_TTL_SECONDS:
+                        jobs.pop(jid, None)
+
+    threading.Thread(target=_reap_jobs, daemon=True).start()
+
     def json_dumps(data: Dict[str, Any]) -> str:
-        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        return orjson.dumps(data).decode()
 
     def _enqueue(job_id: str, payload: Dict[str, Any]) -> None:
         with jobs_lock:
             job = jobs.get(job_id)
-            if not job:
+            if not job or job.get("queue") is None:
                 return
             payload.setdefault("ts", time.time())
             try:
@@ -81,6 +98,7 @@ def create_app() -> Flask:
                 if job is not None:
                     job["status"] = "done"
                     job["results"] = results
+                    job["finished_at"] = time.time()
             _enqueue(job_id, {"message": "done", "status": "done", "stage": "final"})
         except Exception as exc:  # noqa: BLE001
             with jobs_lock:
@@ -88,6 +106,7 @@ def create_app() -> Flask:
                 if job is not None:
                     job["status"] = "error"
                     job["error"] = str(exc)
+                    job["finished_at"] = time.time()
             _enqueue(job_id, {"message": f"error: {exc}", "status": "error"})
 
     @app.post("/analyze")
@@ -99,6 +118,9 @@ def create_app() -> Flask:
         job_id = uuid.uuid4().hex
         q: queue.Queue = queue.Queue(maxsize=1000)
         with jobs_lock:
+            # Cap the registry; dicts keep insertion order so the first key is the oldest job
+            while len(jobs) >= MAX_JOBS:
+                jobs.pop(next(iter(jobs)))
             jobs[job_id] = {
                 "queue": q,
                 "status": "running",
@@ -117,27 +139,45 @@ def create_app() -> Flask:
     def sse_events(job_id: str):
         # Stream events for a given job_id
         def _gen():
-            last_heartbeat = 0.0
-            while True:
-                with jobs_lock:
-                    job = jobs.get(job_id)
-                if job is None:
-                    yield "data: {\"status\": \"error\", \"message\": \"unknown job\"}\n\n"
-                    break
+            # Snapshot the job once; the queue is consumed without holding jobs_lock
+            with jobs_lock:
+                job = jobs.get(job_id)
+                q = job.get("queue") if job else None
+                status = job.get("status") if job else None
+                error = job.get("error") if job else None
+            if job is None:
+                yield "data: {\"status\": \"error\", \"message\": \"unknown job\"}\n\n"
+                return
+            if q is None:
+                # Queue was released after the terminal event; replay the final status
+                if status == "error":
+                    final = {"message": f"error: {error}", "status": "error"}
+                else:
+                    final = {"message": "done", "status": "done", "stage": "final"}
+                yield f"data: {json_dumps(final)}\n\n"
+                return
 
+            while True:
                 try:
-                    payload = job["queue"].get(timeout=5)
-                    msg = json_dumps(payload)
-                    yield f"data: {msg}\n\n"
-                    if payload.get("status") in {"done", "error"}:
-                        break
-                except Exception:
-                    now = time.time()
-                    if now - last_heartbeat > 15:
-                        # heartbeat comment to keep connection alive
-                        yield ": heartbeat\n\n"
-                        last_heartbeat = now
-                        continue
+                    payload = q.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    # Idle: make sure the job was not evicted meanwhile, then keep the connection alive
+                    with jobs_lock:
+                        alive = job_id in jobs
+                    if not alive:
+                        yield "data: {\"status\": \"error\", \"message\": \"unknown job\"}\n\n"
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+
+                yield f"data: {json_dumps(payload)}\n\n"
+                if payload.get("status") in {"done", "error"}:
+                    # Terminal event delivered; drop the queue but keep results for the view
+                    with jobs_lock:
+                        job = jobs.get(job_id)
+                        if job is not None:
+                            job["queue"] = None
+                    return
         headers = {
             "Cache-Control": "no-cache",
             "X-Accel-Buffering": "no",
@@ -181,7 +221,10 @@ def create_app() -> Flask:
 
     return app
 
-app = create_app()
+# Spawned parse workers (see app_services.extractor) re-import this script as __mp_main__;
+# they only need app_services, not a second app with its own reaper thread
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
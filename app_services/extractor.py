@@ -1,20 +1,60 @@
-import json
+import asyncio
+import multiprocessing
+import os
 import re
-from typing import Any, Dict, Optional
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
 
-from bs4 import BeautifulSoup
+import httpx
+import orjson
+from selectolax.lexbor import LexborHTMLParser
 
-from .utils import http_get, clean_title, extract_identifiers
+from .utils import DEFAULT_HEADERS, afetch, http_get, clean_title, extract_identifiers
 
 
-def _parse_json_ld(soup: BeautifulSoup) -> Dict[str, Any]:
+FETCH_CONCURRENCY = 16
+# From this many pages on, parsing moves to a process pool to get around the GIL
+PROCESS_POOL_MIN_PAGES = 8
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+_SPEC_ID = re.compile("spec|feature", re.I)
+_NORM_KEY = re.compile(r"[^a-z0-9]+")
+_MODEL_RE = re.compile(r"\b([A-Z0-9]{3,}[-/][A-Z0-9\-]{2,})\b")
+_HEAD_END = re.compile(r"</head\s*>", re.I)
+# A script can only hold a Product node if the quoted type name appears somewhere in it
+_PRODUCT_HINT = re.compile(r'"product"', re.I)
+
+# schema.org Product identifier fields mapped onto our identifier keys
+_JSON_LD_ID_KEYS = {
+    "gtin": "gtin",
+    "gtin8": "gtin",
+    "gtin12": "gtin",
+    "gtin13": "gtin",
+    "gtin14": "gtin",
+    "mpn": "mpn",
+    "sku": "sku",
+}
+
+# simple synonym normalization for spec keys
+_KEY_SYNONYMS = {
+    "colour": "color",
+    "screen": "screen_size",
+    "display": "screen_size",
+}
+
+
+def _parse_json_ld(tree: LexborHTMLParser) -> Dict[str, Any]:
     data: Dict[str, Any] = {}
-    for script in soup.find_all("script", {"type": "application/ld+json"}):
+    for script in tree.css('script[type="application/ld+json"]'):
         try:
-            content = script.string or script.text
-            if not content:
+            content = script.text()
+            if not content or not _PRODUCT_HINT.search(content):
                 continue
-            obj = json.loads(content)
+            obj = orjson.loads(content)
             items = obj if isinstance(obj, list) else [obj]
             for it in items:
                 if not isinstance(it, dict):
@@ -30,107 +70,207 @@ def _parse_json_ld(soup: BeautifulSoup) -> Dict[str, Any]:
     return data
 
 
-def _meta_content(soup: BeautifulSoup, name: str) -> Optional[str]:
-    el = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
-    return (el.get("content") or "").strip() if el else None
+def _meta_content(tree: LexborHTMLParser, name: str) -> Optional[str]:
+    el = tree.css_first(f'meta[property="{name}"]') or tree.css_first(f'meta[name="{name}"]')
+    return (el.attributes.get("content") or "").strip() if el else None
+
+
+def _json_ld_brand(json_ld: Dict[str, Any]) -> Optional[str]:
+    b = json_ld.get("brand")
+    if isinstance(b, dict):
+        return b.get("name")
+    if isinstance(b, str):
+        return b
+    return None
+
+
+def _json_ld_attributes(json_ld: Dict[str, Any]) -> Dict[str, str]:
+    attributes: Dict[str, str] = {}
+    for key in ["color", "size", "material", "pattern"]:
+        val = json_ld.get(key)
+        if isinstance(val, str) and val.strip():
+            attributes[key] = val.strip()
+    # additionalProperty: [{name, value}]
+    addl = json_ld.get("additionalProperty")
+    if isinstance(addl, list):
+        for prop in addl:
+            if not isinstance(prop, dict):
+                continue
+            name = str(prop.get("name") or "").strip()
+            value = str(prop.get("value") or "").strip()
+            if not name or not value:
+                continue
+            norm = _NORM_KEY.sub("_", name.lower()).strip("_")
+            if norm and value and norm not in attributes:
+                attributes[norm] = value
+    return attributes
+
+
+def _json_ld_identifiers(json_ld: Dict[str, Any]) -> Dict[str, str]:
+    ids: Dict[str, str] = {}
+    for field, key in _JSON_LD_ID_KEYS.items():
+        val = json_ld.get(field)
+        if isinstance(val, (str, int)) and str(val).strip():
+            ids.setdefault(key, str(val).strip())
+    return ids
+
+
+def _guess_model(title: str) -> Optional[str]:
+    m = _MODEL_RE.search(title)
+    return m.group(1) if m else None
+
+
+def _signals_from_json_ld(url: str, json_ld: Dict[str, Any]) -> Dict[str, Any]:
+    title = clean_title(json_ld.get("name") or "")
+    description = str(json_ld.get("description") or "")
+    ids = extract_identifiers(" ".join([title, description]))
+    ids.update(_json_ld_identifiers(json_ld))
+    signals: Dict[str, Any] = {
+        "url": url,
+        "title": title,
+        "brand": _json_ld_brand(json_ld),
+        "description": description,
+        "identifiers": ids,
+        "schema_present": True,
+        "attributes": _json_ld_attributes(json_ld),
+    }
+    model = _guess_model(title)
+    if model:
+        signals["identifiers"].setdefault("model", model)
+    return signals
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn, not fork: the web process is multithreaded
+            _process_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    # A dead worker leaves the pool permanently broken; drop it so the next batch builds a fresh one
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
 
 
 def extract_product_signals(url: str) -> Dict[str, Any]:
     html = http_get(url) or ""
-    soup = BeautifulSoup(html, "lxml")
+    return extract_signals_from_html(url, html)
+
+
+async def extract_all(urls: List[str]) -> List[Dict[str, Any]]:
+    # Fetch pages concurrently on one HTTP/2 client; parse off the event loop, in
+    # worker processes when there are enough pages to outweigh the pickling cost
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    executor: Optional[Executor] = _get_process_pool() if len(urls) >= PROCESS_POOL_MIN_PAGES else None
+
+    async def _bound(url: str, client: httpx.AsyncClient) -> Dict[str, Any]:
+        async with sem:
+            html = await afetch(url, client)
+        if isinstance(executor, ProcessPoolExecutor):
+            try:
+                return await loop.run_in_executor(executor, extract_signals_from_html, url, html or "")
+            except BrokenProcessPool:
+                # Finish this page on the default thread pool instead of losing it
+                _discard_process_pool(executor)
+        return await loop.run_in_executor(None, extract_signals_from_html, url, html or "")
+
+    async with httpx.AsyncClient(http2=True, headers=DEFAULT_HEADERS, timeout=30, follow_redirects=True) as client:
+        results = await asyncio.gather(*[_bound(u, client) for u in urls], return_exceptions=True)
+    return [r for r in results if isinstance(r, dict)]
 
-    json_ld = _parse_json_ld(soup)
-    title = (json_ld.get("name") if json_ld else None) or (soup.title.string if soup.title else None) or _meta_content(soup, "og:title") or ""
+
+def extract_signals_from_html(url: str, html: str) -> Dict[str, Any]:
+    # Fast path: a Product JSON-LD in <head> with name, description and an identifier
+    # is enough on its own, so skip parsing the body and the text/table/dl scans
+    head_end = _HEAD_END.search(html)
+    if head_end:
+        head_ld = _parse_json_ld(LexborHTMLParser(html[:head_end.end()]))
+        if head_ld.get("name") and head_ld.get("description") and _json_ld_identifiers(head_ld):
+            return _signals_from_json_ld(url, head_ld)
+
+    tree = LexborHTMLParser(html)
+
+    json_ld = _parse_json_ld(tree)
+    # Drop script/style/template content so the text blob matches what BeautifulSoup's get_text() saw
+    tree.strip_tags(["script", "style", "template"])
+    title_el = tree.css_first("title")
+    title = (json_ld.get("name") if json_ld else None) or (title_el.text() if title_el else None) or _meta_content(tree, "og:title") or ""
     title = clean_title(title)
 
-    brand = None
-    if json_ld:
-        b = json_ld.get("brand")
-        if isinstance(b, dict):
-            brand = b.get("name")
-        elif isinstance(b, str):
-            brand = b
+    brand = _json_ld_brand(json_ld) if json_ld else None
 
     description = None
     if json_ld:
         description = json_ld.get("description")
     if not description:
-        description = _meta_content(soup, "og:description") or _meta_content(soup, "description")
+        description = _meta_content(tree, "og:description") or _meta_content(tree, "description")
 
     # Fallback common selectors for description
     if not description:
-        desc_el = soup.select_one("#description, .product-description, .product__description, .productDesc, .pdp-description")
+        desc_el = tree.css_first("#description, .product-description, .product__description, .productDesc, .pdp-description")
         if desc_el:
-            description = desc_el.get_text(" ", strip=True)
+            description = desc_el.text(separator=" ", strip=True)
 
-    text_blob = " ".join(filter(None, [title, description or "", soup.get_text(" ")[:2000]]))
+    text_blob = " ".join(filter(None, [title, description or "", tree.text(separator=" ")[:2000]]))
     ids = extract_identifiers(text_blob)
+    if json_ld:
+        ids.update(_json_ld_identifiers(json_ld))
 
     h1 = None
     if not title:
-        h1_el = soup.find("h1")
-        h1 = h1_el.get_text(strip=True) if h1_el else None
+        h1_el = tree.css_first("h1")
+        h1 = h1_el.text(strip=True) if h1_el else None
         title = clean_title(h1 or "")
 
     # Attributes from JSON-LD and page structure
-    attributes: Dict[str, str] = {}
-
     # 1) JSON-LD common fields
-    if json_ld:
-        for key in ["color", "size", "material", "pattern"]:
-            val = json_ld.get(key)
-            if isinstance(val, str) and val.strip():
-                attributes[key] = val.strip()
-        # additionalProperty: [{name, value}]
-        addl = json_ld.get("additionalProperty")
-        if isinstance(addl, list):
-            for prop in addl:
-                if not isinstance(prop, dict):
-                    continue
-                name = str(prop.get("name") or "").strip()
-                value = str(prop.get("value") or "").strip()
-                if not name or not value:
-                    continue
-                norm = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
-                if norm and value and norm not in attributes:
-                    attributes[norm] = value
+    attributes: Dict[str, str] = _json_ld_attributes(json_ld) if json_ld else {}
 
     # 2) Spec tables and definition lists
     def _ingest_pair(k: str, v: str) -> None:
         if not k or not v:
             return
-        k_norm = re.sub(r"[^a-z0-9]+", "_", k.lower()).strip("_")
-        # simple synonym normalization
-        k_norm = {
-            "colour": "color",
-            "screen": "screen_size",
-            "display": "screen_size",
-        }.get(k_norm, k_norm)
+        k_norm = _NORM_KEY.sub("_", k.lower()).strip("_")
+        k_norm = _KEY_SYNONYMS.get(k_norm, k_norm)
         if k_norm and k_norm not in attributes:
             attributes[k_norm] = v.strip()
 
     # tables
-    for tbl in soup.select("table")[:6]:
-        rows = tbl.select("tr")
+    for tbl in tree.css("table")[:6]:
+        rows = tbl.css("tr")
         for row in rows[:30]:
-            th = row.find("th")
-            tds = row.find_all("td")
+            th = row.css_first("th")
+            tds = row.css("td")
             if th and tds:
-                key = th.get_text(" ", strip=True)
-                val = tds[-1].get_text(" ", strip=True)
+                key = th.text(separator=" ", strip=True)
+                val = tds[-1].text(separator=" ", strip=True)
                 _ingest_pair(key, val)
 
     # dl lists
-    for dl in soup.select("dl")[:6]:
-        dts = dl.find_all("dt")
-        dds = dl.find_all("dd")
+    for dl in tree.css("dl")[:6]:
+        dts = dl.css("dt")
+        dds = dl.css("dd")
         for dt, dd in zip(dts, dds):
-            _ingest_pair(dt.get_text(" ", strip=True), dd.get_text(" ", strip=True))
+            _ingest_pair(dt.text(separator=" ", strip=True), dd.text(separator=" ", strip=True))
 
     # bullet lists under spec/feature sections
-    for sec in soup.find_all(True, attrs={"id": re.compile("spec|feature", re.I), "class": re.compile("spec|feature", re.I)}):
-        for li in sec.select("li")[:30]:
-            text = li.get_text(" ", strip=True)
+    for sec in tree.css("[id][class]"):
+        sec_id = sec.attributes.get("id") or ""
+        sec_class = sec.attributes.get("class") or ""
+        if not (_SPEC_ID.search(sec_id) and _SPEC_ID.search(sec_class)):
+            continue
+        for li in sec.css("li")[:30]:
+            text = li.text(separator=" ", strip=True)
             if ":" in text and len(text) < 200:
                 k, v = text.split(":", 1)
                 _ingest_pair(k, v)
@@ -146,10 +286,7 @@ def extract_product_signals(url: str) -> Dict[str, Any]:
     }
 
     # Try to guess model from title
-    model = None
-    m = re.search(r"\b([A-Z0-9]{3,}[-/][A-Z0-9\-]{2,})\b", title)
-    if m:
-        model = m.group(1)
+    model = _guess_model(title)
     if model:
         signals["identifiers"].setdefault("model", model)
 
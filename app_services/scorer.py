@@ -1,16 +1,37 @@
-import math
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
-from rapidfuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
 from openai import OpenAI
 
-from .extractor import extract_product_signals
+from .extractor import extract_all
 from .utils import get_domain
 
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_SIZE = 4096
+
+# Weights for (embedding, title, identifiers, brand, attributes)
+SCORE_WEIGHTS = np.array([0.40, 0.22, 0.18, 0.10, 0.10], dtype=np.float64)
+MIN_SIMILARITY = 0.50
+TOP_K = 5
+
+_NUM_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# (numbers mentioned, normalized text) for one attribute value
+AttrFingerprint = Tuple[FrozenSet[str], str]
+
 _openai_client = None
 
+# In-process LRU of embeddings keyed by sha256(model, text); values are packed int8 bytes
+_embedding_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
 
 def _get_client() -> OpenAI:
     global _openai_client
@@ -19,137 +40,243 @@ def _get_client() -> OpenAI:
     return _openai_client
 
 
-def _embed(texts: List[str]) -> List[List[float]]:
+def _cache_key(text: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def _quantize(emb: List[float]) -> np.ndarray:
+    # Symmetric per-vector int8: scale by the largest component; cosine is scale-invariant
+    v = np.asarray(emb, dtype=np.float32)
+    peak = float(np.abs(v).max()) if v.size else 0.0
+    if peak == 0:
+        return np.zeros(v.shape, dtype=np.int8)
+    return np.clip(np.round(v * (127.0 / peak)), -127, 127).astype(np.int8)
+
+
+def _cache_get(key: str) -> Optional[np.ndarray]:
+    with _embedding_cache_lock:
+        packed = _embedding_cache.get(key)
+        if packed is None:
+            return None
+        _embedding_cache.move_to_end(key)
+    return np.frombuffer(packed, dtype=np.int8)
+
+
+def _cache_put(key: str, q: np.ndarray) -> None:
+    packed = q.tobytes()
+    with _embedding_cache_lock:
+        _embedding_cache[key] = packed
+        _embedding_cache.move_to_end(key)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+
+def _embed(texts: List[str]) -> List[np.ndarray]:
     if not texts:
         return []
-    client = _get_client()
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts,
-    )
-    return [d.embedding for d in resp.data]
-
-
-def _cosine(a: List[float], b: List[float]) -> float:
-    if not a or not b:
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(x * x for x in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
-
-
-def _compute_similarity(seed: Dict, cand: Dict, seed_emb: List[float], cand_emb: List[float]) -> float:
+    keys = [_cache_key(t) for t in texts]
+    out: List[np.ndarray] = [np.zeros(0, dtype=np.int8) for _ in texts]
+    missing_idx: List[int] = []
+    for i, key in enumerate(keys):
+        cached = _cache_get(key)
+        if cached is None:
+            missing_idx.append(i)
+        else:
+            out[i] = cached
+
+    if missing_idx:
+        # One batched request for the misses only; duplicates within the batch are sent once
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing_idx))
+        client = _get_client()
+        resp = client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=missing_texts,
+        )
+        fresh = {t: _quantize(d.embedding) for t, d in zip(missing_texts, resp.data)}
+        for t, q in fresh.items():
+            _cache_put(_cache_key(t), q)
+        for i in missing_idx:
+            out[i] = fresh[texts[i]]
+    return out
+
+
+def _batch_cosine(seed_q: np.ndarray, cand_qs: List[np.ndarray]) -> np.ndarray:
+    # Integer dot products over the int8 matrix, then divide by the row norms
+    sims = np.zeros(len(cand_qs), dtype=np.float32)
+    if not seed_q.size or not cand_qs or any(not q.size for q in cand_qs):
+        return sims
+    seed_vec = seed_q.astype(np.int32)
+    seed_norm = np.sqrt(float(seed_vec @ seed_vec))
+    if seed_norm == 0:
+        return sims
+    M = np.stack(cand_qs).astype(np.int32)
+    dots = M @ seed_vec
+    norms = np.sqrt(np.einsum("ij,ij->i", M, M).astype(np.float64)) + 1e-12
+    return (dots / (norms * seed_norm)).astype(np.float32)
+
+
+def _normalize_value(val: str) -> str:
+    return " ".join(str(val).lower().split())
+
+
+def _batch_title_ratios(seed: Dict, candidates: List[Dict]) -> np.ndarray:
+    # One seed-vs-all token_set_ratio row computed in a single C++ call
+    if not candidates:
+        return np.zeros(0, dtype=np.float32)
     title_seed = (seed.get("title") or "").lower()
-    title_cand = (cand.get("title") or "").lower()
-    brand_seed = (seed.get("brand") or "").lower()
-    brand_cand = (cand.get("brand") or "").lower()
-    ids_seed = seed.get("identifiers") or {}
-    ids_cand = cand.get("identifiers") or {}
-    attrs_seed = seed.get("attributes") or {}
-    attrs_cand = cand.get("attributes") or {}
+    titles_cand = [(c.get("title") or "").lower() for c in candidates]
+    scores = process.cdist([title_seed], titles_cand, scorer=fuzz.token_set_ratio, dtype=np.float32, workers=1)
+    return scores[0] / 100.0
+
+
+def _make_attr_fp(attrs: Dict) -> Dict[str, AttrFingerprint]:
+    # Per attribute: the numbers it mentions and its normalized text, computed once per signals dict
+    fp: Dict[str, AttrFingerprint] = {}
+    for k, v in attrs.items():
+        norm = _normalize_value(v)
+        if norm:
+            fp[k] = (frozenset(_NUM_RE.findall(norm)), norm)
+    return fp
+
 
-    # Embedding similarity
-    s_emb = _cosine(seed_emb, cand_emb)
+def _quick_match(a: AttrFingerprint, b: AttrFingerprint) -> bool:
+    # Shared number or identical normalized text decides a match without fuzzy scoring
+    return bool(a[0] & b[0]) or a[1] == b[1]
 
-    # Fuzzy title match
-    s_title = fuzz.token_set_ratio(title_seed, title_cand) / 100.0
 
-    # Identifier overlap
+def _batch_attr_ratios(fp_seed: Dict[str, AttrFingerprint], fp_cands: List[Dict[str, AttrFingerprint]]) -> List[Dict[str, float]]:
+    # Per candidate, token_set_ratio of each attribute value shared with the seed, batched by key;
+    # pairs already settled by _quick_match are skipped
+    ratios: List[Dict[str, float]] = [{} for _ in fp_cands]
+    for key, seed_fp in fp_seed.items():
+        idx: List[int] = []
+        vals: List[str] = []
+        for i, fp_cand in enumerate(fp_cands):
+            cand_fp = fp_cand.get(key)
+            if cand_fp and not _quick_match(seed_fp, cand_fp):
+                idx.append(i)
+                vals.append(cand_fp[1])
+        if not idx:
+            continue
+        row = process.cdist([seed_fp[1]], vals, scorer=fuzz.token_set_ratio, dtype=np.float32, workers=1)[0]
+        for i, score in zip(idx, row):
+            ratios[i][key] = float(score)
+    return ratios
+
+
+def _id_overlap(seed: Dict, cand: Dict) -> float:
+    ids_seed = seed.get("identifiers") or {}
+    ids_cand = cand.get("identifiers") or {}
     overlap = 0.0
     for key in ["gtin", "mpn", "sku", "model"]:
         if ids_seed.get(key) and ids_cand.get(key) and ids_seed.get(key) == ids_cand.get(key):
             overlap += 1.0
-    s_id = min(overlap, 2.0) / 2.0  # cap
+    return min(overlap, 2.0) / 2.0  # cap
 
-    # Brand match
-    s_brand = 1.0 if brand_seed and brand_seed == brand_cand else 0.0
 
+def _brand_match(seed: Dict, cand: Dict) -> float:
+    brand_seed = (seed.get("brand") or "").lower()
+    brand_cand = (cand.get("brand") or "").lower()
+    return 1.0 if brand_seed and brand_seed == brand_cand else 0.0
+
+
+def _attr_overlap(
+    seed: Dict,
+    cand: Dict,
+    fp_seed: Dict[str, AttrFingerprint],
+    fp_cand: Dict[str, AttrFingerprint],
+    attr_ratios: Dict[str, float],
+) -> float:
     # Attribute overlap (normalized over min number of attrs)
-    def _normalize_value(val: str) -> str:
-        return " ".join(str(val).lower().split())
-
-    def _numbers(s: str) -> List[str]:
-        import re as _re  # local import to avoid top-level extra dep
-        return _re.findall(r"\d+(?:\.\d+)?", s or "")
-
-    def _values_match(a: str, b: str) -> bool:
-        if not a or not b:
-            return False
-        na, nb = _numbers(a), _numbers(b)
-        if na and nb and any(x in nb for x in na):
-            return True
-        return fuzz.token_set_ratio(_normalize_value(a), _normalize_value(b)) >= 85
-
-    common_keys = set(attrs_seed.keys()) & set(attrs_cand.keys())
+    common_keys = fp_seed.keys() & fp_cand.keys()
     matches = 0
     for k in list(common_keys)[:12]:  # cap for speed
-        if _values_match(str(attrs_seed.get(k, "")), str(attrs_cand.get(k, ""))):
+        if _quick_match(fp_seed[k], fp_cand[k]) or attr_ratios.get(k, 0.0) >= 85:
             matches += 1
-    denom = max(1, min(len(attrs_seed), len(attrs_cand)))
-    s_attr = matches / denom
+    denom = max(1, min(len(seed.get("attributes") or {}), len(cand.get("attributes") or {})))
+    return matches / denom
 
-    # Weights include attributes
-    similarity = 0.40 * s_emb + 0.22 * s_title + 0.18 * s_id + 0.10 * s_brand + 0.10 * s_attr
-    return similarity
+
+def _top_matches(sims: np.ndarray) -> np.ndarray:
+    # Indices of the best TOP_K scores at or above MIN_SIMILARITY, best first
+    keep = np.flatnonzero(sims >= MIN_SIMILARITY)
+    if len(keep) > TOP_K:
+        keep = np.sort(keep[np.argpartition(-sims[keep], TOP_K - 1)[:TOP_K]])
+    return keep[np.argsort(-sims[keep], kind="stable")]
 
 
 def score_candidates(seed_signals: Dict, candidate_urls: List[str]) -> List[Dict]:
     # Extract candidate signals concurrently
-    candidates: List[Dict] = []
-    with ThreadPoolExecutor(max_workers=6) as ex:
-        futures = {ex.submit(extract_product_signals, url): url for url in candidate_urls}
-        for fut in as_completed(futures):
-            try:
-                sig = fut.result()
-                candidates.append(sig)
-            except Exception:  # noqa: BLE001
-                continue
-
-    # Prepare embeddings
-    seed_attrs_str = " ".join(
-        f"{k}:{v}" for k, v in list((seed_signals.get("attributes") or {}).items())[:8]
-    )
-    seed_text = " ".join(
+    candidates: List[Dict] = asyncio.run(extract_all(candidate_urls)) if candidate_urls else []
+    if not candidates:
+        return []
+
+    # One column per signal (N x 5), combined with a single weighted matvec. Two exact
+    # identifier hits already pin a match, so such a candidate's embedding term is taken as 1.0
+    id_overlap = np.array([_id_overlap(seed_signals, c) for c in candidates], dtype=np.float64)
+    resolved = id_overlap >= 1.0
+    pending = np.flatnonzero(~resolved)
+    fp_seed = _make_attr_fp(seed_signals.get("attributes") or {})
+    fp_cands = [_make_attr_fp(c.get("attributes") or {}) for c in candidates]
+    attr_ratios = _batch_attr_ratios(fp_seed, fp_cands)
+    features = np.column_stack(
         [
-            seed_signals.get("title") or "",
-            seed_signals.get("brand") or "",
-            " ".join((seed_signals.get("identifiers") or {}).values()),
-            seed_attrs_str,
+            resolved.astype(np.float64),
+            _batch_title_ratios(seed_signals, candidates),
+            id_overlap,
+            [_brand_match(seed_signals, c) for c in candidates],
+            [
+                _attr_overlap(seed_signals, c, fp_seed, fp_c, r)
+                for c, fp_c, r in zip(candidates, fp_cands, attr_ratios)
+            ],
         ]
-    )
-    cand_texts = []
-    for c in candidates:
-        c_attrs_str = " ".join(f"{k}:{v}" for k, v in list((c.get("attributes") or {}).items())[:8])
-        cand_texts.append(
-            " ".join([
-                c.get("title") or "",
-                c.get("brand") or "",
-                " ".join((c.get("identifiers") or {}).values()),
-                c_attrs_str,
-            ])
+    ).astype(np.float64)
+    sims = features @ SCORE_WEIGHTS
+
+    # Embeddings can only be skipped when no pending candidate, even with a perfect embedding
+    # score, could beat the TOP_K-th resolved one
+    need_embeddings = len(pending) > 0
+    if need_embeddings and int(resolved.sum()) >= TOP_K:
+        kth_resolved = np.sort(sims[resolved])[-TOP_K]
+        upper_bounds = sims[pending] + SCORE_WEIGHTS[0]
+        need_embeddings = bool(upper_bounds.max() >= kth_resolved)
+
+    if need_embeddings:
+        seed_attrs_str = " ".join(
+            f"{k}:{v}" for k, v in list((seed_signals.get("attributes") or {}).items())[:8]
         )
-    embs = _embed([seed_text] + cand_texts)
-    seed_emb = embs[0] if embs else []
-    cand_embs = embs[1:] if len(embs) > 1 else [[] for _ in candidates]
-
-    scored = []
-    for cand, emb in zip(candidates, cand_embs):
-        sim = _compute_similarity(seed_signals, cand, seed_emb, emb)
-        scored.append(
-            {
-                "domain": get_domain(cand.get("url", "")),
-                "url": cand.get("url"),
-                "similarity": float(sim),
-                "signals": cand,
-            }
+        seed_text = " ".join(
+            [
+                seed_signals.get("title") or "",
+                seed_signals.get("brand") or "",
+                " ".join((seed_signals.get("identifiers") or {}).values()),
+                seed_attrs_str,
+            ]
         )
+        cand_texts = []
+        for c in (candidates[i] for i in pending):
+            c_attrs_str = " ".join(f"{k}:{v}" for k, v in list((c.get("attributes") or {}).items())[:8])
+            cand_texts.append(
+                " ".join([
+                    c.get("title") or "",
+                    c.get("brand") or "",
+                    " ".join((c.get("identifiers") or {}).values()),
+                    c_attrs_str,
+                ])
+            )
+        embs = _embed([seed_text] + cand_texts)
+        seed_emb = embs[0] if embs else np.zeros(0, dtype=np.int8)
+        cand_embs = embs[1:] if len(embs) > 1 else [np.zeros(0, dtype=np.int8) for _ in pending]
+        features[pending, 0] = _batch_cosine(seed_emb, cand_embs)
+        sims = features @ SCORE_WEIGHTS
 
     # Keep top 3–5 above threshold
-    scored = sorted(scored, key=lambda x: x["similarity"], reverse=True)
-    scored = [s for s in scored if s["similarity"] >= 0.50][:5]
-    return scored
-
-
+    return [
+        {
+            "domain": get_domain(candidates[i].get("url", "")),
+            "url": candidates[i].get("url"),
+            "similarity": float(sims[i]),
+            "signals": candidates[i],
+        }
+        for i in _top_matches(sims)
+    ]
@@ -1,13 +1,15 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Set
 
 import requests
 
-from .utils import get_domain
+from .utils import SESSION, get_domain, normalize_url
 
 
 SERP_API_URL = "https://serpapi.com/search.json"
+MAX_PER_DOMAIN = 2
 
 
 def build_queries(signals: Dict) -> List[str]:
@@ -25,7 +27,7 @@ def build_queries(signals: Dict) -> List[str]:
     return queries[:3]
 
 
-def _serpapi_search(query: str, num: int = 10) -> List[str]:
+def _serpapi_search(query: str, num: int = 10, session: requests.Session = SESSION) -> List[str]:
     api_key = os.environ.get("SERPAPI_KEY")
     if not api_key:
         return []
@@ -38,7 +40,7 @@ def _serpapi_search(query: str, num: int = 10) -> List[str]:
         "gl": "us",
     }
     try:
-        resp = requests.get(SERP_API_URL, params=params, timeout=25)
+        resp = session.get(SERP_API_URL, params=params, timeout=25)
         data = resp.json()
         results = []
         for item in data.get("organic_results", []):
@@ -73,20 +75,31 @@ def _looks_like_product_url(url: str) -> bool:
 def search_candidates(queries: List[str], original_url: str) -> List[str]:
     original_domain = get_domain(original_url)
     candidates: List[str] = []
-    seen_domains: Set[str] = set()
+    seen_norm: Set[str] = set()
+    per_domain: Dict[str, int] = {}
 
-    for q in queries:
-        # Exclude original domain
-        qx = f"{q} -site:{original_domain}"
-        for url in _serpapi_search(qx, num=10):
+    if not queries:
+        return candidates
+
+    # Run queries concurrently (excluding the original domain); merge in query order
+    with ThreadPoolExecutor(max_workers=min(4, len(queries))) as ex:
+        results = list(ex.map(lambda q: _serpapi_search(f"{q} -site:{original_domain}", num=10), queries))
+
+    for urls in results:
+        for url in urls:
             if not _looks_like_product_url(url):
                 continue
             d = get_domain(url)
             if d == original_domain:
                 continue
-            if d in seen_domains:
+            norm = normalize_url(url)
+            if norm in seen_norm:
+                continue
+            # A single domain may hold more than one real match, but cap it
+            if per_domain.get(d, 0) >= MAX_PER_DOMAIN:
                 continue
-            seen_domains.add(d)
+            seen_norm.add(norm)
+            per_domain[d] = per_domain.get(d, 0) + 1
             candidates.append(url)
 
     return candidates[:20]
@@ -1,8 +1,14 @@
+import asyncio
 import re
-import time
+from functools import lru_cache
+from http.cookiejar import DefaultCookiePolicy
 from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 DEFAULT_HEADERS = {
@@ -11,51 +17,98 @@ DEFAULT_HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
+# Shared keep-alive session; retries with backoff are handled by urllib3. It serves unrelated
+# jobs, so cookies are never stored (like the one-off requests.get calls it replaced)
+SESSION = requests.Session()
+SESSION.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
 
+TRACKING_PARAMS = {"gclid", "fbclid", "ref", "mc_cid", "mc_eid"}
+
+_SCHEME_RE = re.compile(r"^https?://")
+_TITLE_SUFFIX = re.compile(r"\s+[\-|–|\|]\s+.*$")
+_WS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
 def get_domain(url: str) -> str:
-    return re.sub(r"^https?://", "", url).split("/")[0].lower()
+    return _SCHEME_RE.sub("", url).split("/")[0].lower()
 
 
-def http_get(url: str, timeout: int = 30, max_retries: int = 2) -> Optional[str]:
-    last_exc: Optional[Exception] = None
+def normalize_url(url: str) -> str:
+    # Canonical form for dedupe: lowercase scheme/host, no fragment, no tracking params
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(query), ""))
+
+
+def http_get(url: str, timeout: int = 30) -> Optional[str]:
+    try:
+        resp = SESSION.get(url, headers=DEFAULT_HEADERS, timeout=timeout)
+    except Exception:  # noqa: BLE001
+        return None
+    if resp.status_code == 200 and "text/html" in resp.headers.get("Content-Type", ""):
+        return resp.text
+    return None
+
+
+async def afetch(url: str, client: httpx.AsyncClient, max_retries: int = 2) -> Optional[str]:
+    # Async counterpart of http_get for fanning out over a shared client
     for attempt in range(max_retries + 1):
         try:
-            resp = requests.get(url, headers=DEFAULT_HEADERS, timeout=timeout)
+            resp = await client.get(url)
             if resp.status_code == 200 and "text/html" in resp.headers.get("Content-Type", ""):
                 return resp.text
-        except Exception as exc:  # noqa: BLE001
-            last_exc = exc
-        time.sleep(0.5 * (attempt + 1))
-    if last_exc:
-        return None
+        except Exception:  # noqa: BLE001
+            pass
+        await asyncio.sleep(0.5 * (attempt + 1))
     return None
 
 
+@lru_cache(maxsize=1024)
 def clean_title(title: str) -> str:
     if not title:
         return ""
     # Remove common separators and store suffixes
-    title = re.sub(r"\s+[\-|–|\|]\s+.*$", "", title).strip()
+    title = _TITLE_SUFFIX.sub("", title).strip()
     # Collapse whitespace
-    title = re.sub(r"\s+", " ", title)
+    title = _WS.sub(" ", title)
     return title[:200]
 
 
-IDENTIFIER_REGEXES = {
-    "gtin": re.compile(r"\b(?:gtin|ean|upc)[\s#:]*([0-9]{8,14})\b", re.I),
-    "mpn": re.compile(r"\bmpn[\s#:]*([\w\-\.]{3,})\b", re.I),
-    "sku": re.compile(r"\bsku[\s#:]*([\w\-\.]{3,})\b", re.I),
+IDENTIFIER_PATTERNS = {
+    "gtin": r"\b(?:gtin|ean|upc)[\s#:]*(?P<gtin>[0-9]{8,14})\b",
+    "mpn": r"\bmpn[\s#:]*(?P<mpn>[\w\-\.]{3,})\b",
+    "sku": r"\bsku[\s#:]*(?P<sku>[\w\-\.]{3,})\b",
 }
 
+# All identifier patterns as one zero-width alternation so the text is scanned in a single
+# pass; the lookahead consumes nothing, so one key's match never hides another's (as with
+# separate searches)
+IDENTIFIER_REGEX = re.compile("(?=" + "|".join(f"(?:{p})" for p in IDENTIFIER_PATTERNS.values()) + ")", re.I)
+
 
 def extract_identifiers(text: str) -> Dict[str, str]:
     ids: Dict[str, str] = {}
     if not text:
         return ids
-    for key, pattern in IDENTIFIER_REGEXES.items():
-        m = pattern.search(text)
-        if m:
-            ids[key] = m.group(1)
+    for m in IDENTIFIER_REGEX.finditer(text):
+        key = m.lastgroup
+        if key and key not in ids:
+            ids[key] = m.group(key)
+            # Later matches can only repeat keys we already have
+            if len(ids) == len(IDENTIFIER_PATTERNS):
+                break
     return ids
 
 